@@ -1,10 +1,20 @@
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
-from gi.repository import Gtk, Adw, GLib, Gio
-from .dbus_client import USBGuardDBus, Target
+from gi.repository import Gtk, Adw, GLib, Gio, GObject
+from dbus.mainloop.glib import DBusGMainLoop
+from .dbus_client import USBGuardDBus, Target, DeviceEvent, parse_rule
+from .search import DeviceSearchIndex
 from typing import Optional
 
+class DeviceItem(GObject.Object):
+    def __init__(self, device_info: dict):
+        super().__init__()
+        self.device_info = device_info
+        # Row widget built for this item, reused when a filter change
+        # removes and re-adds it to the list
+        self.row = None
+
 class DeviceRow(Gtk.ListBoxRow):
     def __init__(self, device_info: dict, usbguard: USBGuardDBus):
         super().__init__()
@@ -112,23 +122,122 @@ class DeviceListBox(Gtk.ListBox):
         self.set_selection_mode(Gtk.SelectionMode.NONE)
         self.add_css_class('boxed-list')
         
-    def refresh_devices(self):
-        while True:
-            row = self.get_row_at_index(0)
-            if row is None:
-                break
-            self.remove(row)
+        # Devices live in a list store mirrored by the search index; both are
+        # kept up to date from device events, so searching only re-evaluates
+        # the filter over rows that already exist
+        self.store = Gio.ListStore(item_type=DeviceItem)
+        self.items = {}
+        self.index = DeviceSearchIndex()
+        self.search_text = ""
+        self.matches = None
+        
+        self.filter = Gtk.CustomFilter.new(self.filter_device)
+        self.filter_model = Gtk.FilterListModel(model=self.store, filter=self.filter)
+        self.bind_model(self.filter_model, self.create_row)
+        
+        self.placeholder = Gtk.Label()
+        self.placeholder.set_margin_top(20)
+        self.placeholder.set_margin_bottom(20)
+        self.set_placeholder(self.placeholder)
+        self.update_placeholder()
+        
+        self.usbguard.subscribe_device_events(self.on_device_event)
+        self.usbguard.subscribe_device_policy_events(self.on_device_policy_changed)
+    
+    def create_row(self, item: DeviceItem):
+        if item.row is None:
+            item.row = DeviceRow(item.device_info, self.usbguard)
+        return item.row
+    
+    def filter_device(self, item: DeviceItem) -> bool:
+        return self.matches is None or item.device_info['id'] in self.matches
+    
+    def set_search_text(self, text: str):
+        text = text.strip()
+        if text == self.search_text:
+            return
+        
+        if text.startswith(self.search_text):
+            change = Gtk.FilterChange.MORE_STRICT
+        elif self.search_text.startswith(text):
+            change = Gtk.FilterChange.LESS_STRICT
+        else:
+            change = Gtk.FilterChange.DIFFERENT
+        
+        self.search_text = text
+        self.matches = self.index.search(text)
+        self.update_placeholder()
+        self.filter.changed(change)
+    
+    def update_placeholder(self):
+        if self.search_text:
+            self.placeholder.set_label("No matching devices")
+        else:
+            self.placeholder.set_label("No USB devices")
+    
+    def update_device(self, device: dict):
+        item = self.items.get(device['id'])
+        if item is not None and item.device_info['rule'] == device['rule'] \
+                and item.device_info['target'] == device['target']:
+            return
+        
+        self.index.add(device)
+        self.matches = self.index.search(self.search_text)
+        
+        new_item = DeviceItem(device)
+        self.items[device['id']] = new_item
+        if item is None:
+            self.store.append(new_item)
+        else:
+            found, position = self.store.find(item)
+            if found:
+                self.store.splice(position, 1, [new_item])
+    
+    def remove_device(self, device_id: int):
+        item = self.items.pop(device_id, None)
+        if item is None:
+            return
+        
+        self.index.remove(device_id)
+        self.matches = self.index.search(self.search_text)
         
+        found, position = self.store.find(item)
+        if found:
+            self.store.remove(position)
+    
+    def on_device_event(self, id, event, target, rule, attributes):
+        if event == DeviceEvent.REMOVE:
+            self.remove_device(int(id))
+        else:
+            device = {'id': int(id)}
+            device.update(parse_rule(str(rule)))
+            device['target'] = Target(int(target))
+            self.update_device(device)
+    
+    def on_device_policy_changed(self, id, target_old, target_new, rule, rule_id):
+        device = {'id': int(id)}
+        device.update(parse_rule(str(rule)))
+        device['target'] = Target(int(target_new))
+        self.update_device(device)
+    
+    def refresh_devices(self):
         try:
             devices = self.usbguard.list_devices()
-            for device in devices:
-                row = DeviceRow(device, self.usbguard)
-                self.append(row)
         except Exception as e:
-            error_label = Gtk.Label(label=f"Error loading devices: {str(e)}")
-            error_label.set_margin_top(20)
-            error_label.set_margin_bottom(20)
-            self.append(error_label)
+            self.index.clear()
+            self.items = {}
+            self.store.remove_all()
+            self.placeholder.set_label(f"Error loading devices: {str(e)}")
+            return
+        
+        self.update_placeholder()
+        present = set()
+        for device in devices:
+            present.add(device['id'])
+            self.update_device(device)
+        for device_id in list(self.items):
+            if device_id not in present:
+                self.remove_device(device_id)
 
 class PolicyWindow(Adw.Window):
     def __init__(self, usbguard: USBGuardDBus):
@@ -199,13 +308,25 @@ class MainWindow(Adw.ApplicationWindow):
         
         toolbar_view.add_top_bar(header)
         
+        content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Search name, vendor:product, serial or port")
+        self.search_entry.set_margin_start(12)
+        self.search_entry.set_margin_end(12)
+        self.search_entry.set_margin_top(6)
+        self.search_entry.connect('search-changed', self.on_search_changed)
+        self.search_entry.set_key_capture_widget(self)
+        content.append(self.search_entry)
+        
         scrolled = Gtk.ScrolledWindow()
         scrolled.set_vexpand(True)
         
         self.device_list = DeviceListBox(usbguard)
         scrolled.set_child(self.device_list)
+        content.append(scrolled)
         
-        toolbar_view.set_content(scrolled)
+        toolbar_view.set_content(content)
         
         self.set_content(toolbar_view)
         self.device_list.refresh_devices()
@@ -213,6 +334,9 @@ class MainWindow(Adw.ApplicationWindow):
     def on_refresh_clicked(self, button):
         self.device_list.refresh_devices()
     
+    def on_search_changed(self, entry):
+        self.device_list.set_search_text(entry.get_text())
+    
     def on_policy_clicked(self, button):
         policy_window = PolicyWindow(self.usbguard)
         policy_window.present()
@@ -225,6 +349,8 @@ class USBGuardApp(Adw.Application):
     
     def do_activate(self):
         if self.usbguard is None:
+            # Device events are delivered through the GLib main loop
+            DBusGMainLoop(set_as_default=True)
             try:
                 self.usbguard = USBGuardDBus()
             except Exception as e:
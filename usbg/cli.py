@@ -1,9 +1,16 @@
 import argparse
+import re
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 from .app import USBGuardApp
 from .waybar import waybar_main
 from .dbus_client import USBGuardDBus
+from .config import Config
+from .history import HistoryStore
+
+RELATIVE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
 
 def generate_policy(args):
     usbguard = USBGuardDBus()
@@ -37,6 +44,33 @@ def block_device(args):
     usbguard.apply_device_policy(args.device_id, 1, args.permanent)
     print(f"Device {args.device_id} blocked{'(permanent)' if args.permanent else ''}")
 
+def parse_time(value: str) -> float:
+    # Accepts relative ages such as "90m", "2d" or an ISO 8601 date/time
+    match = re.fullmatch(r'(\d+)([smhdw])', value)
+    if match:
+        return time.time() - int(match.group(1)) * RELATIVE_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time: {value!r}")
+
+def show_history(args):
+    store = HistoryStore.from_config(Config())
+    
+    for record in store.query(args.since, args.until, args.device):
+        when = datetime.fromtimestamp(record['t']).strftime('%Y-%m-%d %H:%M:%S')
+        target = record.get('target', '').upper()
+        if 'previous' in record:
+            target = f"{record['previous'].upper()} -> {target}"
+        line = f"{when} [{record['id']}] {record.get('name', 'Unknown Device')} - {record['event']} {target}"
+        if 'actor' in record:
+            line += f" ({record['actor']})"
+        print(line)
+        if args.verbose:
+            print(f"  ID: {record.get('vid_pid', '')}")
+            print(f"  Port: {record.get('port', '')}")
+            print(f"  Serial: {record.get('serial', '')}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="USBGuard Waybar Applet - Control USBGuard from Waybar and CLI"
@@ -68,6 +102,16 @@ def main():
     block_parser.add_argument('-p', '--permanent', action='store_true',
                              help='Make policy permanent')
     
+    history_parser = subparsers.add_parser('history', help='Show device event history')
+    history_parser.add_argument('--since', type=parse_time,
+                                help='Start time (ISO 8601 or age such as 2h, 7d)')
+    history_parser.add_argument('--until', type=parse_time,
+                                help='End time (ISO 8601 or age such as 2h, 7d)')
+    history_parser.add_argument('--device',
+                                help='Device ID, vendor:product, serial, hash or name')
+    history_parser.add_argument('-v', '--verbose', action='store_true',
+                                help='Verbose output')
+    
     args = parser.parse_args()
     
     if args.command == 'gui' or args.command is None:
@@ -83,6 +127,8 @@ def main():
         allow_device(args)
     elif args.command == 'block':
         block_device(args)
+    elif args.command == 'history':
+        show_history(args)
     else:
         parser.print_help()
         return 1
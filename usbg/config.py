@@ -17,6 +17,11 @@ class Config:
         'usbguard': {
             'auto_allow_known': False,
             'notification_on_block': True,
+        },
+        'history': {
+            'enabled': True,
+            'max_segment_size': 1048576,
+            'max_segments': 8,
         }
     }
     
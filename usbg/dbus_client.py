@@ -1,4 +1,5 @@
 import dbus
+import re
 from enum import IntEnum
 from typing import List, Dict, Any, Optional
 
@@ -14,6 +15,52 @@ class DevicePolicy(IntEnum):
     KEEP = 3
     APPLY_POLICY = 4
 
+class DeviceEvent(IntEnum):
+    PRESENT = 0
+    INSERT = 1
+    UPDATE = 2
+    REMOVE = 3
+
+_TARGET_MAP = {
+    'allow': Target.ALLOW,
+    'block': Target.BLOCK,
+    'reject': Target.REJECT
+}
+
+_VID_PID_RE = re.compile(r'(?:^|\s)id ([0-9a-fA-F*]{1,4}:[0-9a-fA-F*]{1,4})')
+_INTERFACE_RE = re.compile(r'(?:^|\s)with-interface (?:\{([^}]*)\}|(\S+))')
+
+def _quoted_field(rule: str, key: str) -> str:
+    match = re.search(r'(?:^|\s)' + re.escape(key) + r' "((?:[^"\\]|\\.)*)"', rule)
+    return match.group(1) if match else ""
+
+def parse_rule(rule: str) -> Dict[str, Any]:
+    rule_parts = rule.split()
+    target_str = rule_parts[0] if rule_parts else "block"
+    target = _TARGET_MAP.get(target_str.lower(), Target.BLOCK)
+    
+    vid_pid = _VID_PID_RE.search(rule)
+    
+    interface_types = []
+    interface = _INTERFACE_RE.search(rule)
+    if interface:
+        interface_types = (interface.group(1) or interface.group(2)).split()
+    
+    port = _quoted_field(rule, 'via-port')
+    return {
+        'name': _quoted_field(rule, 'name') or "Unknown Device",
+        'target': target,
+        'vid_pid': vid_pid.group(1) if vid_pid else '',
+        'serial': _quoted_field(rule, 'serial'),
+        'port': port,
+        'interface_types': interface_types,
+        'device_hash': _quoted_field(rule, 'hash'),
+        'parent_hash': _quoted_field(rule, 'parent-hash'),
+        'via_port': port,
+        'with_interface': ' '.join(interface_types),
+        'rule': rule
+    }
+
 class USBGuardDBus:
     DBUS_SERVICE = "org.usbguard1"
     DBUS_POLICY_PATH = "/org/usbguard1/Policy"
@@ -48,54 +95,8 @@ class USBGuardDBus:
         for dev in devices_raw:
             device_id = dev[0]
             rule = dev[1]
-            
-            rule_parts = rule.split()
-            target_str = rule_parts[0] if rule_parts else "block"
-            
-            target_map = {
-                'allow': Target.ALLOW,
-                'block': Target.BLOCK,
-                'reject': Target.REJECT
-            }
-            target = target_map.get(target_str.lower(), Target.BLOCK)
-            
-            name_start = rule.find('name "')
-            name = "Unknown Device"
-            if name_start != -1:
-                name_start += 6
-                name_end = rule.find('"', name_start)
-                if name_end != -1:
-                    name = rule[name_start:name_end]
-            
-            serial_start = rule.find('serial "')
-            serial = ""
-            if serial_start != -1:
-                serial_start += 8
-                serial_end = rule.find('"', serial_start)
-                if serial_end != -1:
-                    serial = rule[serial_start:serial_end]
-            
-            port_start = rule.find('via-port "')
-            port = ""
-            if port_start != -1:
-                port_start += 10
-                port_end = rule.find('"', port_start)
-                if port_end != -1:
-                    port = rule[port_start:port_end]
-            
-            device = {
-                'id': device_id,
-                'name': name,
-                'target': target,
-                'serial': serial,
-                'port': port,
-                'interface_types': [],
-                'device_hash': '',
-                'parent_hash': '',
-                'via_port': port,
-                'with_interface': '',
-                'rule': rule
-            }
+            device = {'id': device_id}
+            device.update(parse_rule(rule))
             devices.append(device)
         return devices
     
@@ -143,6 +144,14 @@ class USBGuardDBus:
             signal_name="DevicePresenceChanged"
         )
     
+    def subscribe_device_policy_events(self, callback):
+        # Emitted when a device's target is changed through applyDevicePolicy
+        self.bus.add_signal_receiver(
+            callback,
+            dbus_interface="org.usbguard.Devices1",
+            signal_name="DevicePolicyChanged"
+        )
+    
     def subscribe_policy_events(self, callback):
         self.bus.add_signal_receiver(
             callback,
@@ -0,0 +1,364 @@
+import bisect
+import fcntl
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from gi.repository import GLib
+
+from .dbus_client import DeviceEvent, Target, parse_rule
+
+# Device history is kept as a directory of append-only JSON-lines segments.
+# Each segment is named after the millisecond timestamp of its first record
+# (plus a sequence number to keep names unique), so the time range covered by
+# a segment is known from the directory listing alone. Only the process
+# holding the store-wide writer lock appends, which keeps segments from
+# overlapping in time when several applets run at once. When a segment is
+# rotated out, a small ".idx" sidecar is written with its first/last
+# timestamps, the set of device keys it mentions and a sparse (timestamp,
+# byte offset) table, which lets queries skip whole segments and seek
+# straight to the first interesting record.
+
+class HistoryStore:
+    SEGMENT_SUFFIX = ".log"
+    INDEX_SUFFIX = ".idx"
+    LOCK_NAME = "writer.lock"
+    INDEX_STRIDE = 64
+
+    def __init__(self, path: Optional[str] = None,
+                 max_segment_size: int = 1024 * 1024,
+                 max_segments: int = 8):
+        if path:
+            self.path = Path(path)
+        else:
+            state_dir = Path(os.environ.get('XDG_STATE_HOME',
+                                            Path.home() / '.local' / 'state'))
+            self.path = state_dir / 'usbg' / 'history'
+
+        self.max_segment_size = max_segment_size
+        self.max_segments = max(max_segments, 1)
+
+        self._lock = None
+        self._file = None
+        self._segment = None
+        self._size = 0
+        self._count = 0
+        self._first = None
+        self._last = None
+        self._devices = set()
+        self._offsets = []
+
+    @classmethod
+    def from_config(cls, config) -> 'HistoryStore':
+        return cls(
+            path=config.get('history', 'path'),
+            max_segment_size=config.get('history', 'max_segment_size', 1024 * 1024),
+            max_segments=config.get('history', 'max_segments', 8)
+        )
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        # Returns False when another process is the writer
+        if self._lock is None and not self._acquire_lock():
+            return False
+
+        record.setdefault('t', round(time.time(), 3))
+        line = (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+        if self._file is not None and self._count > 0 \
+                and self._size + len(line) > self.max_segment_size:
+            self._seal()
+        if self._file is None:
+            self._open_segment(record['t'])
+
+        if self._count % self.INDEX_STRIDE == 0:
+            self._offsets.append([record['t'], self._size])
+        self._file.write(line)
+        self._file.flush()
+
+        self._size += len(line)
+        self._count += 1
+        if self._first is None:
+            self._first = record['t']
+        self._last = record['t']
+        self._devices.update(_device_keys(record))
+        return True
+
+    def close(self):
+        if self._file is not None:
+            self._seal()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              device: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        device_key = device.lower() if device else None
+        segments = self._segments()
+
+        for i, segment in enumerate(segments):
+            start = _segment_start(segment)
+            if until is not None and start > until:
+                break
+            if since is not None and i + 1 < len(segments) \
+                    and _segment_start(segments[i + 1]) <= since:
+                continue
+
+            index = self._load_index(segment)
+            offset = 0
+            if index is not None:
+                if since is not None and index['last'] < since:
+                    continue
+                if device_key is not None and device_key not in index['devices']:
+                    continue
+                if since is not None and index['offsets']:
+                    times = [entry[0] for entry in index['offsets']]
+                    pos = max(bisect.bisect_left(times, since) - 1, 0)
+                    offset = index['offsets'][pos][1]
+
+            for record in self._read_segment(segment, offset):
+                t = record.get('t', 0)
+                if since is not None and t < since:
+                    continue
+                if until is not None and t > until:
+                    return
+                if device_key is not None and device_key not in _device_keys(record):
+                    continue
+                yield record
+
+    def _segments(self) -> List[Path]:
+        if not self.path.is_dir():
+            return []
+        return sorted(self.path.glob('*' + self.SEGMENT_SUFFIX), key=_segment_key)
+
+    def _acquire_lock(self) -> bool:
+        self.path.mkdir(parents=True, exist_ok=True)
+        lock = open(self.path / self.LOCK_NAME, 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        self._lock = lock
+        return True
+
+    def _open_segment(self, t: float):
+        self._recover()
+
+        sequence = 0
+        while True:
+            segment = self.path / f"{int(t * 1000):013d}-{sequence}{self.SEGMENT_SUFFIX}"
+            try:
+                self._file = open(segment, 'xb')
+                break
+            except FileExistsError:
+                sequence += 1
+        self._segment = segment
+        self._size = 0
+        self._count = 0
+        self._first = None
+        self._last = None
+        self._devices = set()
+        self._offsets = []
+        self._prune()
+
+    def _seal(self):
+        self._write_index(self._segment, {
+            'first': self._first,
+            'last': self._last,
+            'devices': sorted(self._devices),
+            'offsets': self._offsets
+        })
+        self._file.close()
+        self._file = None
+        self._segment = None
+
+    def _recover(self):
+        # Index segments left unsealed by a previous writer; holding the
+        # writer lock means none of them is still being appended to
+        for segment in self._segments():
+            if not segment.with_suffix(self.INDEX_SUFFIX).exists():
+                self._write_index(segment, self._scan_index(segment))
+
+    def _scan_index(self, segment: Path) -> Dict[str, Any]:
+        index = {'first': None, 'last': None, 'devices': set(), 'offsets': []}
+        count = 0
+        offset = 0
+        with open(segment, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                if count % self.INDEX_STRIDE == 0:
+                    index['offsets'].append([record['t'], offset])
+                if index['first'] is None:
+                    index['first'] = record['t']
+                index['last'] = record['t']
+                index['devices'].update(_device_keys(record))
+                count += 1
+                offset += len(line)
+        index['devices'] = sorted(index['devices'])
+        if index['first'] is None:
+            index['first'] = index['last'] = _segment_start(segment)
+        return index
+
+    def _write_index(self, segment: Path, index: Dict[str, Any]):
+        index_path = segment.with_suffix(self.INDEX_SUFFIX)
+        tmp_path = index_path.with_suffix(self.INDEX_SUFFIX + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, index_path)
+
+    def _load_index(self, segment: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(segment.with_suffix(self.INDEX_SUFFIX), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        index['devices'] = set(index.get('devices', []))
+        return index
+
+    def _read_segment(self, segment: Path, offset: int) -> Iterator[Dict[str, Any]]:
+        try:
+            f = open(segment, 'rb')
+        except FileNotFoundError:
+            # Pruned by the writer while we were reading
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Partially written trailing line
+                    continue
+
+    def _prune(self):
+        segments = self._segments()
+        for segment in segments[:max(len(segments) - self.max_segments, 0)]:
+            if segment == self._segment:
+                continue
+            segment.unlink(missing_ok=True)
+            segment.with_suffix(self.INDEX_SUFFIX).unlink(missing_ok=True)
+
+class HistoryRecorder:
+    # USBGuard reports an inserted device with its pre-policy target and then
+    # emits DevicePolicyChanged for the decision it applied. A policy change
+    # arriving within this window of an insert, starting from the target the
+    # insert reported, is taken as that decision.
+    POLICY_DECISION_WINDOW_MS = 1000
+
+    def __init__(self, usbguard_client, store: HistoryStore):
+        self.client = usbguard_client
+        self.store = store
+        self._pending_inserts = {}
+        # Records in arrival order; writing stops at the first insert still
+        # waiting for its decision so the store stays ordered by time
+        self._queue = []
+
+        self.client.subscribe_device_events(self.on_device_event)
+        self.client.subscribe_device_policy_events(self.on_device_policy_changed)
+
+    def on_device_event(self, id, event, target, rule, attributes):
+        device_id = int(id)
+        # Presence changes are reported by the device, nobody acted on them
+        record = make_record(device_id, _enum_name(DeviceEvent, event), target, rule)
+
+        if event == DeviceEvent.INSERT:
+            self._pending_inserts[device_id] = record
+            GLib.timeout_add(self.POLICY_DECISION_WINDOW_MS,
+                             self._flush_insert, device_id, record)
+        else:
+            self._flush_insert(device_id, self._pending_inserts.get(device_id))
+        self.record(record)
+
+    def on_device_policy_changed(self, id, target_old, target_new, rule, rule_id):
+        device_id = int(id)
+        pending = self._pending_inserts.get(device_id)
+        if pending is not None and pending['target'] == _enum_name(Target, target_old):
+            # Decision applied by the daemon to a freshly inserted device
+            del self._pending_inserts[device_id]
+            pending['target'] = _enum_name(Target, target_new)
+            pending['actor'] = 'policy'
+            if rule_id:
+                pending['rule_id'] = int(rule_id)
+            self._drain()
+            return
+
+        record = make_record(device_id, 'policy', target_new, rule, 'user')
+        record['previous'] = _enum_name(Target, target_old)
+        if rule_id:
+            record['rule_id'] = int(rule_id)
+        self.record(record)
+
+    def _flush_insert(self, device_id: int, record: Optional[Dict[str, Any]]):
+        if record is not None and self._pending_inserts.get(device_id) is record:
+            del self._pending_inserts[device_id]
+            self._drain()
+        return False
+
+    def record(self, record: Dict[str, Any]):
+        self._queue.append(record)
+        self._drain()
+
+    def _drain(self):
+        while self._queue:
+            record = self._queue[0]
+            if self._pending_inserts.get(record['id']) is record:
+                break
+            del self._queue[0]
+            try:
+                self.store.append(record)
+            except OSError as e:
+                print(f"Error writing device history: {e}", file=sys.stderr, flush=True)
+
+    def close(self):
+        self._pending_inserts.clear()
+        self._drain()
+        self.store.close()
+
+def make_record(device_id, event: str, target, rule: str,
+                actor: str = '') -> Dict[str, Any]:
+    device = parse_rule(str(rule))
+    record = {
+        't': round(time.time(), 3),
+        'event': event,
+        'id': int(device_id),
+        'target': _enum_name(Target, target),
+        'actor': actor,
+        'name': device['name'],
+        'vid_pid': device['vid_pid'],
+        'serial': device['serial'],
+        'port': device['port'],
+        'hash': device['device_hash'],
+        'interfaces': device['with_interface'],
+    }
+    return {key: value for key, value in record.items() if value != ''}
+
+def _device_keys(record: Dict[str, Any]) -> set:
+    keys = {str(record.get('id', ''))}
+    for field in ('vid_pid', 'serial', 'hash', 'name'):
+        if record.get(field):
+            keys.add(str(record[field]).lower())
+    keys.discard('')
+    return keys
+
+def _segment_key(segment: Path) -> tuple:
+    start, _, sequence = segment.stem.partition('-')
+    try:
+        return int(start), int(sequence or 0)
+    except ValueError:
+        return 0, 0
+
+def _segment_start(segment: Path) -> float:
+    return _segment_key(segment)[0] / 1000
+
+def _enum_name(enum, value) -> str:
+    try:
+        return enum(int(value)).name.lower()
+    except ValueError:
+        return str(value)
@@ -0,0 +1,83 @@
+import bisect
+import re
+from typing import Iterable, Optional, Set
+
+# Incrementally maintained prefix index over the searchable device fields.
+# Tokens are kept in a sorted list so every query term is resolved with a
+# bisect followed by a scan over the tokens sharing its prefix.
+
+_SPLIT_RE = re.compile(r'[\W_]+')
+
+def device_tokens(device: dict) -> Set[str]:
+    tokens = set()
+    for field in ('name', 'vid_pid', 'serial', 'port'):
+        value = str(device.get(field, '')).lower()
+        if not value:
+            continue
+        # Whole values let "1-2.3" or "046d:c5" match as typed, the words
+        # inside them let "cruzer" find "SanDisk Cruzer Blade"
+        tokens.add(value)
+        tokens.update(_SPLIT_RE.split(value))
+    tokens.discard('')
+    return tokens
+
+class DeviceSearchIndex:
+    def __init__(self):
+        self._tokens = []
+        self._postings = {}
+        self._device_tokens = {}
+
+    def __len__(self) -> int:
+        return len(self._device_tokens)
+
+    def add(self, device: dict):
+        device_id = device['id']
+        tokens = device_tokens(device)
+        old_tokens = self._device_tokens.get(device_id, set())
+
+        for token in old_tokens - tokens:
+            self._remove_posting(token, device_id)
+        for token in tokens - old_tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            postings.add(device_id)
+
+        self._device_tokens[device_id] = tokens
+
+    def remove(self, device_id: int):
+        for token in self._device_tokens.pop(device_id, set()):
+            self._remove_posting(token, device_id)
+
+    def clear(self):
+        self._tokens = []
+        self._postings = {}
+        self._device_tokens = {}
+
+    def search(self, query: str) -> Optional[Set[int]]:
+        # None means the query does not restrict the result
+        terms = query.lower().split()
+        if not terms:
+            return None
+
+        matches = None
+        for term in terms:
+            term_matches = set(self._prefix_matches(term))
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                break
+        return matches
+
+    def _prefix_matches(self, term: str) -> Iterable[int]:
+        i = bisect.bisect_left(self._tokens, term)
+        while i < len(self._tokens) and self._tokens[i].startswith(term):
+            yield from self._postings[self._tokens[i]]
+            i += 1
+
+    def _remove_posting(self, token: str, device_id: int):
+        postings = self._postings[token]
+        postings.discard(device_id)
+        if not postings:
+            del self._postings[token]
+            del self._tokens[bisect.bisect_left(self._tokens, token)]
@@ -1,4 +1,5 @@
 import json
+import signal
 import sys
 import time
 from typing import Optional
@@ -7,59 +8,164 @@ from gi.repository import GLib
 # Import the mainloop for dbus-python to work with GLib
 from dbus.mainloop.glib import DBusGMainLoop
 
-from .dbus_client import USBGuardDBus, Target
+from .dbus_client import USBGuardDBus, Target, DeviceEvent, parse_rule
 from .notifications import NotificationManager
+from .config import Config
+from .history import HistoryStore, HistoryRecorder
 
 class WaybarOutput:
     def __init__(self, continuous=False):
         self.usbguard = USBGuardDBus()
         self.continuous = continuous
+        self.config = Config()
+        self.show_tooltip = self.config.get('waybar', 'show_tooltip', True)
+        
+        # Per-device tooltip fragments, already markup- and JSON-escaped,
+        # keyed by device id and dropped on that device's events
+        self._fragments = {}
+        self._blocked_since = {}
+        self._last_line = None
+        # Devices by id, loaded once and then kept current from device
+        # events so periodic updates need no D-Bus round trip
+        self._devices = None
         
         if continuous:
             # Initialize Notifications
             self.notifier = NotificationManager(self.usbguard)
-
-    def get_device_count(self) -> dict:
-        try:
-            devices = self.usbguard.list_devices()
-            allowed = sum(1 for d in devices if d['target'] == Target.ALLOW)
-            blocked = sum(1 for d in devices if d['target'] == Target.BLOCK)
-            total = len(devices)
             
-            return {
-                'total': total,
-                'allowed': allowed,
-                'blocked': blocked
-            }
-        except Exception:
-            return {'total': 0, 'allowed': 0, 'blocked': 0}
+            # Record device events to the persistent history
+            self.history = None
+            if self.config.get('history', 'enabled', True):
+                self.history = HistoryRecorder(self.usbguard,
+                                               HistoryStore.from_config(self.config))
+            
+            self.usbguard.subscribe_device_events(self.on_device_event)
+            self.usbguard.subscribe_device_policy_events(self.on_device_policy_changed)
+
+    def list_devices(self) -> list:
+        if self._devices is None:
+            try:
+                devices = self.usbguard.list_devices()
+            except Exception:
+                return []
+            self._devices = {device['id']: device for device in devices}
+        return list(self._devices.values())
+
+    def get_device_count(self, devices: Optional[list] = None) -> dict:
+        if devices is None:
+            devices = self.list_devices()
+        allowed = sum(1 for d in devices if d['target'] == Target.ALLOW)
+        blocked = sum(1 for d in devices if d['target'] == Target.BLOCK)
+        rejected = sum(1 for d in devices if d['target'] == Target.REJECT)
+        total = len(devices)
+        
+        return {
+            'total': total,
+            'allowed': allowed,
+            'blocked': blocked,
+            'rejected': rejected
+        }
+
+    def on_device_event(self, id, event, target, rule, attributes):
+        device_id = int(id)
+        self.invalidate_device(device_id)
+        if event == DeviceEvent.REMOVE:
+            self._blocked_since.pop(device_id, None)
+            if self._devices is not None:
+                self._devices.pop(device_id, None)
+            return
+        
+        if event == DeviceEvent.INSERT and target != Target.ALLOW:
+            self._blocked_since[device_id] = time.time()
+        self.update_device(device_id, target, rule)
+
+    def on_device_policy_changed(self, id, target_old, target_new, rule, rule_id):
+        device_id = int(id)
+        self.invalidate_device(device_id)
+        if target_new == Target.ALLOW:
+            self._blocked_since.pop(device_id, None)
+        elif target_old == Target.ALLOW:
+            self._blocked_since[device_id] = time.time()
+        self.update_device(device_id, target_new, rule)
+
+    def update_device(self, device_id: int, target, rule):
+        if self._devices is None:
+            return
+        device = {'id': device_id}
+        device.update(parse_rule(str(rule)))
+        device['target'] = Target(int(target))
+        self._devices[device_id] = device
+
+    def invalidate_device(self, device_id: int):
+        self._fragments.pop(device_id, None)
+
+    def device_fragment(self, device: dict) -> str:
+        cached = self._fragments.get(device['id'])
+        if cached is not None:
+            return cached
+
+        target = Target(device['target'])
+        line = f"<b>{GLib.markup_escape_text(device['name'])}</b>  {target.name}"
+        if device['port']:
+            line += f"  port {GLib.markup_escape_text(device['port'])}"
+        if target != Target.ALLOW and device['id'] in self._blocked_since:
+            # Only known for devices seen being blocked by this process
+            since = time.localtime(self._blocked_since[device['id']])
+            line += time.strftime("  blocked since %Y-%m-%d %H:%M", since)
+
+        # Strip the surrounding quotes so fragments can be concatenated
+        # straight into the JSON string value
+        fragment = json.dumps(line, ensure_ascii=False)[1:-1]
+        self._fragments[device['id']] = fragment
+        return fragment
+
+    def format_tooltip(self, devices: list, counts: dict) -> str:
+        summary = (f"USB Devices: {counts['allowed']} allowed, "
+                   f"{counts['blocked']} blocked, {counts['rejected']} rejected")
+        fragments = [self.device_fragment(device) for device in devices]
+        return "\\n".join([summary] + fragments)
       
-    def format_output(self) -> dict:
-        counts = self.get_device_count()
+    def format_output(self) -> str:
+        devices = self.list_devices()
+        counts = self.get_device_count(devices)
           
-        if counts['blocked'] > 0:
+        if counts['blocked'] > 0 or counts['rejected'] > 0:
             icon = "🔒"
-            tooltip_class = "blocked"
         elif counts['total'] > 0:
             icon = "🔓"
-            tooltip_class = "allowed"
         else:
             icon = "⚫"
-            tooltip_class = "none"
+          
+        classes = []
+        if counts['blocked'] > 0:
+            classes.append("blocked")
+        if counts['rejected'] > 0:
+            classes.append("reject")
+        if not classes and counts['total'] > 0:
+            classes.append("allowed")
+        if counts['total'] == 0:
+            classes.append("none")
+        if sum(1 for key in ('allowed', 'blocked', 'rejected') if counts[key] > 0) > 1:
+            classes.append("mixed")
           
         text = f"{icon} {counts['allowed']}/{counts['total']}"
-        tooltip = f"USB Devices: {counts['allowed']} allowed, {counts['blocked']} blocked"
+        percentage = int((counts['allowed'] / counts['total'] * 100) if counts['total'] > 0 else 0)
           
-        return {
-            "text": text,
-            "tooltip": tooltip,
-            "class": tooltip_class,
-            "percentage": int((counts['allowed'] / counts['total'] * 100) if counts['total'] > 0 else 0)
-        }
+        line = '{"text": ' + json.dumps(text, ensure_ascii=False)
+        if self.show_tooltip:
+            line += ', "tooltip": "' + self.format_tooltip(devices, counts) + '"'
+        line += ', "class": ' + json.dumps(classes[0] if len(classes) == 1 else classes)
+        line += ', "percentage": ' + str(percentage) + '}'
+        return line
       
-    def print_status(self):
-        output = self.format_output()
-        print(json.dumps(output), flush=True)
+    def print_status(self, separator: str = ''):
+        line = self.format_output()
+        if line == self._last_line:
+            return True
+        if separator:
+            print(separator, flush=True)
+        print(line, flush=True)
+        self._last_line = line
         return True # Return True to keep the GLib timeout running
 
     def run(self):
@@ -81,17 +187,24 @@ class WaybarOutput:
         # (This is a simplified version; proper JSON stream handling in Waybar 
         # usually tolerates newline delimited JSON objs too, but let's stick to your format)
         def print_comma_wrapper():
-            print(',', flush=True)
-            return self.print_status()
+            return self.print_status(',')
 
         # Schedule periodic updates (polling is still useful for state consistency)
         # but now we also have event support for notifications
         GLib.timeout_add_seconds(2, print_comma_wrapper)
 
+        # Waybar and systemd stop the module with SIGTERM; quit the loop so
+        # the history below is flushed and closed
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, loop.quit)
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, loop.quit)
+
         try:
             loop.run()
         except KeyboardInterrupt:
             pass
+        finally:
+            if self.history is not None:
+                self.history.close()
 
 def waybar_main(continuous: bool = False):
     # IMPORTANT: Initialize DBus GMainLoop BEFORE creating the client